@@ -1,14 +1,22 @@
 import streamlit as st
 import pandas as pd
 import joblib
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from streamlit_folium import st_folium
 import folium
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from io import StringIO
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
+import warnings
+
+# The model was fitted on a DataFrame; predicting on a plain array is intentional.
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
 st.set_page_config(
     page_title="Project CORAL",
     page_icon="🐠",
@@ -16,7 +24,31 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 MODEL_FILE = 'app/coral_bleaching_model.pkl'
-HISTORICAL_DATA_FILE = 'app/coral_data_PROCESSED.csv'
+HISTORICAL_DATA_FILE = 'app/coral_data_PROCESSED.parquet'
+HISTORICAL_CSV_FILE = 'app/coral_data_PROCESSED.csv'
+
+FEATURES_FOR_MODEL = [
+    'sea_surface_temp_c', 'hotspot_c', 'degree_heating_week_c_weeks',
+    'sst_anomaly_c', 'bleaching_alert_area', 'bleaching_alert_area_7d_max',
+    'year', 'month', 'day_of_year', 'week_of_year'
+]
+
+HISTORICAL_COLUMNS = ['time', 'location_name'] + FEATURES_FOR_MODEL + ['bleaching_risk_percent']
+HISTORICAL_CSV_DTYPES = {
+    'location_name': 'category',
+    **{col: 'float32' for col in FEATURES_FOR_MODEL[:6]},
+    'bleaching_risk_percent': 'float32',
+}
+
+# Same ERDDAP column layout as the data pipeline's fetcher (header and units rows skipped).
+LIVE_COLUMNS = ['time', 'latitude', 'longitude'] + FEATURES_FOR_MODEL[:6]
+LIVE_CSV_OPTIONS = {
+    'skiprows': 2,
+    'names': LIVE_COLUMNS,
+    'dtype': {col: 'float32' for col in LIVE_COLUMNS[1:]},
+    'parse_dates': ['time'],
+    'date_format': '%Y-%m-%dT%H:%M:%S%z',
+}
 
 REEF_LOCATIONS = {
     "Andaman_Islands": {"lat": 11.25, "lon": 92.77},
@@ -35,20 +67,58 @@ def load_model():
         return None
 
 
-@st.cache_data
+@st.cache_data(persist="disk", max_entries=1, show_spinner=False)
 def load_historical_data():
-    """Load the processed historical data from CSV."""
+    """Load the processed historical data from Parquet, falling back to the CSV export."""
     try:
-        df = pd.read_csv(HISTORICAL_DATA_FILE, parse_dates=['time'])
+        df = pd.read_parquet(HISTORICAL_DATA_FILE, engine="pyarrow", columns=HISTORICAL_COLUMNS)
+        return df
+    except FileNotFoundError:
+        pass
+    try:
+        df = pd.read_csv(HISTORICAL_CSV_FILE, engine="pyarrow", usecols=HISTORICAL_COLUMNS,
+                         dtype=HISTORICAL_CSV_DTYPES, parse_dates=['time'])
         return df
     except FileNotFoundError:
         st.error(
-            f"Error: Historical data file not found at '{HISTORICAL_DATA_FILE}'. Please run the preprocessor script.")
+            f"Error: Historical data file not found at '{HISTORICAL_DATA_FILE}' or '{HISTORICAL_CSV_FILE}'. "
+            f"Please run the preprocessor script.")
         return None
-@st.cache_data(ttl=3600)
-def get_live_data(lat, lon):
+
+
+@st.cache_resource
+def get_http_session():
+    """Create a shared HTTP session so ERDDAP connections are kept alive across reruns."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=2, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
+    ))
+    return session
+
+
+@st.cache_resource
+def split_by_location(_df):
+    """
+    Split the historical data into one DataFrame per location, once per process.
+    Cached as a resource so reruns share the frames instead of unpickling copies;
+    callers must treat them as read-only.
+    """
+    return {name: group for name, group in _df.groupby('location_name', sort=False, observed=True)}
+
+
+def _fetch_csv(session, url):
+    """Downloads an ERDDAP CSV response, raising on HTTP errors."""
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+
+def get_live_data(lat, lon, session):
     """
-    Fetches the last 30 days of data, trying multiple servers for reliability.
+    Fetches the last 30 days of data from all mirror servers concurrently and
+    uses the first valid response, so one slow server does not stall the app.
     """
     end_date = datetime.utcnow() - timedelta(days=1)
     start_date = end_date - timedelta(days=30)
@@ -66,37 +136,139 @@ def get_live_data(lat, lon):
         )
     query = ",".join(query_parts)
 
-    for i, base_url in enumerate(server_urls):
-        request_url = f"{base_url}?{query}"
-        try:
-            response = requests.get(request_url, timeout=30)
-            response.raise_for_status()
-            csv_data = response.text
+    executor = ThreadPoolExecutor(max_workers=len(server_urls))
+    futures = [executor.submit(_fetch_csv, session, f"{base_url}?{query}") for base_url in server_urls]
+    try:
+        for future in as_completed(futures):
+            try:
+                csv_data = future.result()
+            except requests.exceptions.RequestException:
+                continue
             if "ERROR" in csv_data or len(csv_data) < 100:
                 continue
 
-            df = pd.read_csv(StringIO(csv_data), skiprows=[1])
-            df.columns = [
-                'time', 'latitude', 'longitude', 'sea_surface_temp_c', 'hotspot_c',
-                'degree_heating_week_c_weeks', 'sst_anomaly_c', 'bleaching_alert_area',
-                'bleaching_alert_area_7d_max'
-            ]
-            df['time'] = pd.to_datetime(df['time'])
-            return df.sort_values('time').iloc[-1:]
-
-        except requests.exceptions.RequestException:
-            continue
+            try:
+                df = pd.read_csv(StringIO(csv_data), **LIVE_CSV_OPTIONS)
+            except ValueError:
+                continue
+            if df.empty or not pd.api.types.is_datetime64_any_dtype(df['time']):
+                continue
+            return df.iloc[[df['time'].argmax()]]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return None
 
 
+@st.cache_data(ttl=3600)
+def get_live_data_all():
+    """
+    Fetches the latest live data for every reef in REEF_LOCATIONS at once, so
+    switching between reefs is served from the cache instead of new requests.
+    Returns a dict mapping each location name to its latest row (or None).
+    """
+    session = get_http_session()
+    with ThreadPoolExecutor(max_workers=len(REEF_LOCATIONS)) as executor:
+        futures = {
+            name: executor.submit(get_live_data, coords['lat'], coords['lon'], session)
+            for name, coords in REEF_LOCATIONS.items()
+        }
+    live_data = {}
+    for name, future in futures.items():
+        try:
+            live_data[name] = future.result()
+        except Exception:
+            # A failure for one reef falls back to its historical data without
+            # taking the other reefs down with it.
+            live_data[name] = None
+    return live_data
+
+
 def preprocess_live_data(df):
     """Preprocesses live data to match the model's training format."""
+    if len(df) == 1:
+        # Live data is a single row, so read the date parts off one timestamp
+        # instead of building a Series per .dt accessor.
+        t = df['time'].iloc[0].to_pydatetime()
+        df['year'] = t.year
+        df['month'] = t.month
+        df['day_of_year'] = t.timetuple().tm_yday
+        df['week_of_year'] = t.isocalendar()[1]
+        return df
     df['year'] = df['time'].dt.year
     df['month'] = df['time'].dt.month
     df['day_of_year'] = df['time'].dt.dayofyear
     df['week_of_year'] = df['time'].dt.isocalendar().week.astype(int)
     return df
+def _row_to_features(row):
+    """Builds the 1x10 model input for a single preprocessed row, in training order."""
+    return np.array([[row[col] for col in FEATURES_FOR_MODEL]], dtype=np.float32)
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _predict_cached(location_name, sst, dhw, base_features):
+    """
+    Predicts the simulated risk for one slider position. `base_features` is the
+    baseline feature row as a tuple; SST and DHW are overridden by the sliders.
+    """
+    features = np.array([base_features], dtype=np.float32)
+    features[0, FEATURES_FOR_MODEL.index('sea_surface_temp_c')] = sst
+    features[0, FEATURES_FOR_MODEL.index('degree_heating_week_c_weeks')] = dhw
+    return float(load_model().predict(features)[0])
+
+
+@st.cache_resource(max_entries=32)
+def _build_hist_fig(location_name, columns_to_plot, _location_df):
+    """
+    Build the historical line chart for a location and tuple of metrics.
+    Keyed on the location and metrics only; the figure is shared, so do not mutate it.
+    """
+    return px.line(_location_df, x='time', y=list(columns_to_plot),
+                   title=f'Historical Data for {location_name.replace("_", " ")}',
+                   labels={'value': 'Value', 'time': 'Date', 'variable': 'Metric'})
+
+
+@st.cache_resource
+def _build_reef_map():
+    """
+    Build the static reef selection map once per process.
+    The map is shared by every session, so it must not be mutated after creation;
+    click state comes from st_folium's return value.
+    """
+    m = folium.Map(location=[20.5937, 78.9629], zoom_start=5)
+    for name, coords in REEF_LOCATIONS.items():
+        folium.Marker(
+            location=[coords['lat'], coords['lon']],
+            popup=name.replace("_", " "),
+            tooltip=name.replace("_", " "),
+            icon=folium.Icon(color='blue', icon='water')
+        ).add_to(m)
+    return m
+
+
+@st.fragment
+def _simulator(location_name, live_df_processed):
+    """
+    Render the What-If sliders and simulated risk. As a fragment, moving a slider
+    reruns only this block, not the data loading, map and live fetch in main().
+    """
+    # Slider positions sit on a fixed 0.1 grid, so rounding to 2 decimals gives stable cache keys
+    # without shifting the baseline away from the live values.
+    base_sst = float(live_df_processed['sea_surface_temp_c'].iloc[0])
+    base_dhw = float(live_df_processed['degree_heating_week_c_weeks'].iloc[0])
+    sim_sst = st.slider("Sea Surface Temperature (°C)", min_value=base_sst - 2, max_value=base_sst + 4,
+                        value=base_sst, step=0.1)
+    sim_dhw = st.slider("Degree Heating Weeks (°C-weeks)", min_value=0.0, max_value=base_dhw + 8,
+                        value=base_dhw, step=0.1)
+    base_features = tuple(_row_to_features(live_df_processed.iloc[0])[0].tolist())
+
+    sim_prediction = _predict_cached(location_name, round(sim_sst, 2), round(sim_dhw, 2), base_features)
+    st.divider()
+    st.metric(label="Simulated Bleaching Risk", value=f"{sim_prediction:.2f}%")
+    st.info(
+        "This simulation provides an estimate based on the model's learned patterns. Real-world outcomes can be influenced by other complex factors.")
+
+
 def create_risk_gauge(risk_value):
     """Creates a Plotly gauge chart for the risk score."""
     fig = go.Figure(go.Indicator(
@@ -120,6 +292,7 @@ def main():
 
     if model is None or historical_df is None:
         st.stop()
+    hist_by_loc = split_by_location(historical_df)
     st.title("🐠 Project CORAL: The Coral Oracle")
     st.markdown("""
         Welcome to Project CORAL, an AI-powered early warning system designed to protect India's precious marine ecosystems. 
@@ -129,14 +302,7 @@ def main():
     st.divider()
     with st.sidebar:
         st.header("Select a Reef Location")
-        m = folium.Map(location=[20.5937, 78.9629], zoom_start=5)
-        for name, coords in REEF_LOCATIONS.items():
-            folium.Marker(
-                location=[coords['lat'], coords['lon']],
-                popup=name.replace("_", " "),
-                tooltip=name.replace("_", " "),
-                icon=folium.Icon(color='blue', icon='water')
-            ).add_to(m)
+        m = _build_reef_map()
         map_data = st_folium(m, width=380, height=380)
 
         if map_data and map_data.get("last_object_clicked_popup"):
@@ -150,30 +316,30 @@ def main():
         st.info("Please select a reef from the map in the sidebar to begin.")
     else:
         location_name = st.session_state.selected_location
-        coords = REEF_LOCATIONS[location_name]
 
         st.header(f"Dashboard for: {location_name.replace('_', ' ')}")
         with st.spinner("Fetching and analyzing data..."):
-            live_df_raw = get_live_data(coords['lat'], coords['lon'])
+            live_df_raw = get_live_data_all()[location_name]
 
             if live_df_raw is None or live_df_raw.empty:
-                location_historical_df = historical_df[historical_df['location_name'] == location_name]
-                live_df_raw = location_historical_df.sort_values('time').iloc[-1:].copy()
+                location_hist = hist_by_loc[location_name]
+                live_df_raw = location_hist.iloc[[location_hist['time'].argmax()]].copy()
                 fallback_date = pd.to_datetime(live_df_raw['time'].iloc[0]).strftime('%B %d, %Y')
                 st.warning(
                     f"⚠️ Could not connect to live data servers. Displaying the most recent historical data from **{fallback_date}**.",
                     icon="🛰️")
+        live_df_processed = None
+        if live_df_raw is not None and not live_df_raw.empty:
+            # Historical fallback rows already carry the date features from the preprocessor.
+            if {'year', 'month', 'day_of_year', 'week_of_year'}.issubset(live_df_raw.columns):
+                live_df_processed = live_df_raw
+            else:
+                live_df_processed = preprocess_live_data(live_df_raw.copy())
         tab1, tab2, tab3 = st.tabs(
             ["🌊 Live Risk Assessment", "🔬 'What-If' Scenario Simulator", "📈 Historical Data Explorer"])
         with tab1:
             if live_df_raw is not None and not live_df_raw.empty:
-                live_df_processed = preprocess_live_data(live_df_raw.copy())
-                features_for_model = [
-                    'sea_surface_temp_c', 'hotspot_c', 'degree_heating_week_c_weeks',
-                    'sst_anomaly_c', 'bleaching_alert_area', 'bleaching_alert_area_7d_max',
-                    'year', 'month', 'day_of_year', 'week_of_year'
-                ]
-                prediction = model.predict(live_df_processed[features_for_model])[0]
+                prediction = model.predict(_row_to_features(live_df_processed.iloc[0]))[0]
                 col1, col2 = st.columns([1, 2])
                 with col1:
                     st.metric(label="Predicted Bleaching Risk", value=f"{prediction:.2f}%")
@@ -199,47 +365,25 @@ def main():
             )
 
             if live_df_raw is not None and not live_df_raw.empty:
-                base_sst = live_df_raw['sea_surface_temp_c'].iloc[0]
-                base_dhw = live_df_raw['degree_heating_week_c_weeks'].iloc[0]
-                sim_sst = st.slider("Sea Surface Temperature (°C)", min_value=base_sst - 2, max_value=base_sst + 4,
-                                    value=base_sst, step=0.1)
-                sim_dhw = st.slider("Degree Heating Weeks (°C-weeks)", min_value=0.0, max_value=base_dhw + 8,
-                                    value=base_dhw, step=0.1)
-                sim_df = live_df_raw.copy()
-                sim_df['sea_surface_temp_c'] = sim_sst
-                sim_df['degree_heating_week_c_weeks'] = sim_dhw
-                sim_df_processed = preprocess_live_data(sim_df)
-
-                features_for_model = [
-                    'sea_surface_temp_c', 'hotspot_c', 'degree_heating_week_c_weeks',
-                    'sst_anomaly_c', 'bleaching_alert_area', 'bleaching_alert_area_7d_max',
-                    'year', 'month', 'day_of_year', 'week_of_year'
-                ]
-
-                sim_prediction = model.predict(sim_df_processed[features_for_model])[0]
-                st.divider()
-                st.metric(label="Simulated Bleaching Risk", value=f"{sim_prediction:.2f}%")
-                st.info(
-                    "This simulation provides an estimate based on the model's learned patterns. Real-world outcomes can be influenced by other complex factors.")
+                _simulator(location_name, live_df_processed)
             else:
                 st.error("Data is required for the simulator. Please try again later.")
         with tab3:
             st.subheader("Explore Historical Trends")
-            location_historical_df = historical_df[historical_df['location_name'] == location_name].copy()
+            location_historical_df = hist_by_loc[location_name]
             default_selection = ['sea_surface_temp_c', 'degree_heating_week_c_weeks', 'bleaching_risk_percent']
             columns_to_plot = st.multiselect(
                 "Select data to plot:",
                 options=default_selection + [col for col in location_historical_df.columns if
-                                             col not in default_selection and location_historical_df[col].dtype in [
-                                                 'float64', 'int64']],
+                                             col not in default_selection and pd.api.types.is_numeric_dtype(
+                                                 location_historical_df[col])],
                 default=default_selection
             )
             if columns_to_plot:
-                fig = px.line(location_historical_df, x='time', y=columns_to_plot,
-                              title=f'Historical Data for {location_name.replace("_", " ")}',
-                              labels={'value': 'Value', 'time': 'Date', 'variable': 'Metric'})
+                fig = _build_hist_fig(location_name, tuple(columns_to_plot), location_historical_df)
                 st.plotly_chart(fig, use_container_width=True)
-                max_risk_row = location_historical_df.loc[location_historical_df['bleaching_risk_percent'].idxmax()]
+                max_risk_pos = np.nanargmax(location_historical_df['bleaching_risk_percent'].to_numpy())
+                max_risk_row = location_historical_df.iloc[max_risk_pos]
                 st.success(
                     f"**Historical Insight:** The highest predicted bleaching risk of **{max_risk_row['bleaching_risk_percent']:.2f}%** "
                     f"occurred on **{max_risk_row['time'].strftime('%B %d, %Y')}**, "
@@ -1,41 +1,68 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import argparse
+from numba import njit, prange
 
 
-def apply_heuristic_labels(df):
+@njit('void(float64[:], float64[:], float64[:])', parallel=True, cache=True)
+def _label_kernel(dhw, u, out):
+    """
+    Writes a heuristic bleaching percentage for every DHW value into `out`,
+    scaling the pre-drawn uniforms in `u` into the range for its DHW bin.
+    Negative or NaN DHW values are labelled 0.
+    """
+    for i in prange(dhw.size):
+        d = dhw[i]
+        if d == 0:
+            out[i] = 1.0 + u[i] * 4.0
+        elif 0 < d < 4:
+            out[i] = 10.0 + u[i] * 20.0
+        elif 4 <= d < 8:
+            out[i] = 30.0 + u[i] * 30.0
+        elif d >= 8:
+            out[i] = 60.0 + u[i] * 30.0
+        else:
+            out[i] = 0.0
+
+
+def apply_heuristic_labels(df, seed=42):
     """
     Applies bleaching percentage labels based on Degree Heating Weeks (DHW).
     This function creates our target variable for the model.
+    The labels are reproducible for a given `seed`.
     """
     print("\nApplying heuristic labels based on DHW...")
 
-    conditions = [
-        (df['degree_heating_week_c_weeks'] == 0),
-        (df['degree_heating_week_c_weeks'] > 0) & (df['degree_heating_week_c_weeks'] < 4),
-        (df['degree_heating_week_c_weeks'] >= 4) & (df['degree_heating_week_c_weeks'] < 8),
-        (df['degree_heating_week_c_weeks'] >= 8)
-    ]
-    choices = [
-        np.random.uniform(1, 5, size=len(df)),
-        np.random.uniform(10, 30, size=len(df)),
-        np.random.uniform(30, 60, size=len(df)),
-        np.random.uniform(60, 90, size=len(df))
-    ]
-
-    df['bleaching_risk_percent'] = np.select(conditions, choices, default=0)
-    df['bleaching_risk_percent'] = df['bleaching_risk_percent'].round(2)
+    dhw = np.ascontiguousarray(df['degree_heating_week_c_weeks'].to_numpy(dtype=np.float64))
+    u = np.random.default_rng(seed).random(len(dhw))
+    out = np.empty(len(dhw))
+    _label_kernel(dhw, u, out)
+    df['bleaching_risk_percent'] = np.round(out, 2)
 
     print("✅ Heuristic labels applied.")
     return df
 
 
+def assign_split(df, train_fraction=0.8, seed=42):
+    """
+    Adds a boolean 'split' column marking the rows used for training (True) and
+    testing (False), so every trainer evaluates on the same held-out rows.
+    The split is reproducible for a given `seed`.
+    """
+    # Seeded as [seed, 1] so the draws are independent of the heuristic labels' stream.
+    df['split'] = np.random.default_rng([seed, 1]).random(len(df)) < train_fraction
+    print(f"✅ Train/test split assigned ({df['split'].sum()} train rows, {(~df['split']).sum()} test rows).")
+    return df
+
+
 def feature_engineer(df):
     """
     Creates new time-based features from the 'time' column.
     """
     print("\nStarting feature engineering...")
-    df['time'] = pd.to_datetime(df['time'])
+    df['time'] = pd.to_datetime(df['time'], format='ISO8601', utc=True)
     df['year'] = df['time'].dt.year
     df['month'] = df['time'].dt.month
     df['day_of_year'] = df['time'].dt.dayofyear
@@ -45,6 +72,18 @@ def feature_engineer(df):
     return df
 
 
+def optimize_dtypes(df):
+    """
+    Downcasts float columns to float32 and stores 'location_name' as a category
+    so the processed dataset is smaller on disk and in memory.
+    """
+    float_cols = df.select_dtypes(include='float').columns
+    for col in float_cols:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    df['location_name'] = df['location_name'].astype('category')
+    return df
+
+
 def clean_data(df):
     """
     Performs initial cleaning and inspection of the dataset.
@@ -54,20 +93,22 @@ def clean_data(df):
     df.info()
 
     print("\n2. Checking for Missing Values (NaN):")
-    missing_values = df.isnull().sum()
-    print(missing_values)
+    na_mask = df.isna().any()
+    cols_with_na = na_mask.index[na_mask.to_numpy()].tolist()
 
-    if missing_values.sum() > 0:
+    if cols_with_na:
+        print(f"Columns with missing values: {cols_with_na}")
         print("\nHandling missing values...")
-        df.fillna(method='ffill', inplace=True)
+        df[cols_with_na] = df[cols_with_na].ffill()
         print("✅ Missing values handled using forward fill.")
     else:
         print("✅ No missing values found.")
 
     print("\n3. Checking for Duplicates:")
-    duplicates = df.duplicated().sum()
+    rows_before = len(df)
+    df.drop_duplicates(inplace=True)
+    duplicates = rows_before - len(df)
     if duplicates > 0:
-        df.drop_duplicates(inplace=True)
         print(f"✅ Removed {duplicates} duplicate rows.")
     else:
         print("✅ No duplicate rows found.")
@@ -82,28 +123,41 @@ if __name__ == "__main__":
     parser.add_argument(
         'input_file',
         type=str,
-        help='Path to the input CSV file (e.g., coral_data_COMPLETE.csv)'
+        help='Path to the input CSV or Parquet file (e.g., coral_data_COMPLETE.parquet)'
     )
     parser.add_argument(
         '-o', '--output',
         type=str,
-        default='coral_data_PROCESSED.csv',
-        help='Path for the output processed CSV file.'
+        default='coral_data_PROCESSED.parquet',
+        help='Path for the output processed file. Written as CSV if it ends in .csv, otherwise as Parquet.'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=42,
+        help='Random seed for the heuristic labels and the train/test split (default: 42).'
     )
     args = parser.parse_args()
 
     print(f"--- Loading data from '{args.input_file}' ---")
     try:
-        raw_df = pd.read_csv(args.input_file)
+        if args.input_file.endswith('.parquet'):
+            raw_df = pd.read_parquet(args.input_file)
+        else:
+            raw_df = pd.read_csv(args.input_file)
         print(f"✅ Successfully loaded {len(raw_df)} rows.")
     except FileNotFoundError:
         print(f"❌ ERROR: Input file not found at '{args.input_file}'")
         exit()
     cleaned_df = clean_data(raw_df)
     engineered_df = feature_engineer(cleaned_df)
-    final_df = apply_heuristic_labels(engineered_df)
+    labelled_df = apply_heuristic_labels(engineered_df, seed=args.seed)
+    final_df = optimize_dtypes(assign_split(labelled_df, seed=args.seed))
     try:
-        final_df.to_csv(args.output, index=False)
+        if args.output.endswith('.csv'):
+            pacsv.write_csv(pa.Table.from_pandas(final_df, preserve_index=False), args.output)
+        else:
+            final_df.to_parquet(args.output, compression='zstd', index=False)
         print(f"\n--- Processing Complete! ---")
         print(f"✅ Final processed data saved to '{args.output}'")
         print("\nFinal dataset preview:")
@@ -1,15 +1,27 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
-from io import StringIO
+import urllib3
+from io import BytesIO
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
 import time
 import calendar
 
+# Shared with the main fetcher: its cached, rate-limited session (one throttle for the
+# ERDDAP host, already-downloaded chunks served from its cache) and its column names.
+from noaa_data_fetcher import SESSION, ERDDAP_COLUMNS, is_body_read_error
+
+ERDDAP_DTYPES = {col: 'float32' for col in ERDDAP_COLUMNS[1:]}
+
+
 def get_coral_reef_watch_data(lat, lon, start_date, end_date, max_retries=3):
     """
     Fetches all 6 core NOAA Coral Reef Watch variables for a specific location and time range.
-    (This is the same robust function from the main script)
+    (Adapted from the main script; SESSION retries failed connections and 5xx responses,
+    and only a body that breaks off mid-read is retried here, up to `max_retries` times.)
     """
     base_url = "https://coastwatch.pfeg.noaa.gov/erddap/griddap/NOAA_DHW.csv"
     variables = [
@@ -23,49 +35,68 @@ def get_coral_reef_watch_data(lat, lon, start_date, end_date, max_retries=3):
     query = ",".join(query_parts)
     request_url = f"{base_url}?{query}"
 
+    df = None
     for attempt in range(max_retries):
         try:
-            print(f"  Attempt {attempt + 1}/{max_retries}...", end=" ")
-            response = requests.get(request_url, timeout=120)
+            response = SESSION.get(request_url, timeout=120)
             response.raise_for_status()
-            csv_data = response.text
-            if "ERROR" in csv_data or len(csv_data) < 100:
-                print(f"Server error or no data")
-                if attempt < max_retries - 1: time.sleep(5)
-                continue
-            df = pd.read_csv(StringIO(csv_data), skiprows=[1])
-            df.columns = [
-                'time', 'latitude', 'longitude', 'sea_surface_temp_c', 'hotspot_c',
-                'degree_heating_week_c_weeks', 'sst_anomaly_c', 'bleaching_alert_area',
-                'bleaching_alert_area_7d_max'
-            ]
-            df['time'] = pd.to_datetime(df['time'])
-            print(f"Success! ({len(df)} rows)")
-            return df
-        except requests.exceptions.RequestException as e:
-            print(f"Error: {e}")
-            if attempt < max_retries - 1: time.sleep(10)
-    return None
+            df = pd.read_csv(
+                BytesIO(response.content),
+                skiprows=2,
+                names=ERDDAP_COLUMNS,
+                dtype=ERDDAP_DTYPES,
+                parse_dates=['time'],
+                date_format='%Y-%m-%dT%H:%M:%S%z'
+            )
+            break
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            if not is_body_read_error(e) or attempt == max_retries - 1:
+                print(f"  {start_date} to {end_date}: Error: {e}")
+                return None
+            print(f"  {start_date} to {end_date}: Attempt {attempt + 1}/{max_retries} failed ({e}), retrying...")
+            time.sleep(2 ** attempt)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, ValueError):
+            break
+    # An ERDDAP error page parses into rows whose 'time' is not a timestamp.
+    if df is None or df.empty or not pd.api.types.is_datetime64_any_dtype(df['time']):
+        print(f"  {start_date} to {end_date}: Server error or no data")
+        return None
+    print(f"  {start_date} to {end_date}: Success! ({len(df)} rows)")
+    return df
 
-def fetch_data_in_chunks(lat, lon, start_year, end_year, chunk_months=3):
+def fetch_data_in_chunks(lat, lon, start_year, end_year, chunk_months=3, max_workers=4):
     """
     Fetches data in smaller, reliable monthly chunks.
-    (This is the same robust function from the main script)
+    Chunks are requested concurrently by `max_workers` threads, throttled by SESSION's adapter.
     """
-    all_dfs = []
+    jobs = []
     for year in range(start_year, end_year + 1):
         for month_start in range(1, 13, chunk_months):
             month_end = min(month_start + chunk_months - 1, 12)
             start_date = f"{year}-{month_start:02d}-01"
             end_day = calendar.monthrange(year, month_end)[1]
             end_date = f"{year}-{month_end:02d}-{end_day}"
-            print(f"Fetching {start_date} to {end_date}...")
-            df = get_coral_reef_watch_data(lat, lon, start_date, end_date)
+            jobs.append((start_date, end_date))
+
+    print(f"Fetching {len(jobs)} chunks with {max_workers} workers...")
+    all_dfs = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_coral_reef_watch_data, lat, lon, start_date, end_date): (start_date, end_date)
+            for start_date, end_date in jobs
+        }
+        for future in as_completed(futures):
+            start_date, end_date = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                # One broken chunk must not abort the run and discard everything fetched so far.
+                print(f"  {start_date} to {end_date}: Failed ({e})")
+                df = None
             if df is not None and not df.empty:
                 all_dfs.append(df)
             else:
-                print(f"  No data returned for this chunk.")
-            time.sleep(2)
+                print(f"  No data returned for {start_date} to {end_date}.")
     return all_dfs
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -74,8 +105,8 @@ if __name__ == "__main__":
     parser.add_argument(
         '-o', '--output',
         type=str,
-        default='gulf_of_mannar_data.csv',
-        help='Path for the output CSV file.'
+        default='gulf_of_mannar_data.parquet',
+        help='Path for the output file, written as CSV if it ends in .csv, otherwise as Parquet.'
     )
     parser.add_argument('-s', '--start-year', type=int, default=1985)
     parser.add_argument('-e', '--end-year', type=int, default=datetime.now().year - 1)
@@ -100,10 +131,13 @@ if __name__ == "__main__":
     if location_dfs:
         location_df = pd.concat(location_dfs, ignore_index=True)
         location_df['location_name'] = location_to_fetch['name']
-        location_df = location_df.sort_values('time').reset_index(drop=True)
+        location_df = location_df.sort_values('time', ignore_index=True)
 
         output_filename = args.output
-        location_df.to_csv(output_filename, index=False)
+        if output_filename.endswith('.csv'):
+            pacsv.write_csv(pa.Table.from_pandas(location_df, preserve_index=False), output_filename)
+        else:
+            location_df.to_parquet(output_filename, compression='zstd', index=False)
         print(f"\n✅ Success! Missing data saved to '{output_filename}'")
     else:
         print("\n❌ FAILED: Could not download data for Gulf of Mannar.")
@@ -1,10 +1,30 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import argparse
 
 
+def read_table(path):
+    """
+    Reads a dataset from Parquet or CSV into an Arrow table, based on the file extension.
+    Dictionary (categorical) columns are decoded to plain values so tables can be
+    filtered, concatenated and sorted together.
+    """
+    if path.endswith('.parquet'):
+        table = pq.read_table(path)
+    else:
+        table = pacsv.read_csv(path)
+    for idx, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(idx, field.name, table.column(idx).cast(field.type.value_type))
+    return table
+
+
 def merge_data(original_file, missing_data_file, final_output_file):
     """
     Merges the original dataset with the newly fetched data.
+    All steps run on Arrow tables, so the data is never materialised in pandas.
 
     Args:
         original_file (str): Path to the master file with the empty rows.
@@ -13,24 +33,39 @@ def merge_data(original_file, missing_data_file, final_output_file):
     """
     try:
         print(f"Loading original master file: {original_file}")
-        df_master = pd.read_csv(original_file)
+        table_master = read_table(original_file)
 
         print(f"Loading new data file: {missing_data_file}")
-        df_missing = pd.read_csv(missing_data_file)
-        print(f"\nOriginal file has {len(df_master):,} rows.")
-        print(f"New data file has {len(df_missing):,} rows for Gulf of Mannar.")
+        table_missing = read_table(missing_data_file)
+        print(f"\nOriginal file has {table_master.num_rows:,} rows.")
+        print(f"New data file has {table_missing.num_rows:,} rows for Gulf of Mannar.")
         print("\nRemoving empty 'Gulf_of_Mannar' rows from the original file...")
-        original_rows = len(df_master)
-        df_master_filtered = df_master[df_master['location_name'] != 'Gulf_of_Mannar'].copy()
-        rows_removed = original_rows - len(df_master_filtered)
+        original_rows = table_master.num_rows
+        table_master_filtered = table_master.filter(pc.not_equal(table_master['location_name'], 'Gulf_of_Mannar'))
+        rows_removed = original_rows - table_master_filtered.num_rows
         print(f"Removed {rows_removed:,} rows.")
         print("Concatenating the datasets...")
-        df_final = pd.concat([df_master_filtered, df_missing], ignore_index=True)
-        df_final = df_final.sort_values(['location_name', 'time']).reset_index(drop=True)
-        df_final.to_csv(final_output_file, index=False)
+        # Both inputs are cast to the master's column order, with floats narrowed to float32.
+        schema = pa.schema([
+            pa.field(field.name, pa.float32()) if pa.types.is_floating(field.type) else field
+            for field in table_master.schema
+        ])
+        table_final = pa.concat_tables([
+            table_master_filtered.cast(schema),
+            table_missing.select(schema.names).cast(schema),
+        ])
+        table_final = table_final.sort_by([('location_name', 'ascending'), ('time', 'ascending')])
+        if final_output_file.endswith('.csv'):
+            pacsv.write_csv(table_final, final_output_file)
+        else:
+            location_idx = table_final.schema.get_field_index('location_name')
+            table_final = table_final.set_column(
+                location_idx, 'location_name', pc.dictionary_encode(table_final['location_name'])
+            )
+            pq.write_table(table_final, final_output_file, compression='zstd')
 
         print(f"\n✅ Success! Final, complete dataset saved to '{final_output_file}'")
-        print(f"The final dataset has {len(df_final):,} rows.")
+        print(f"The final dataset has {table_final.num_rows:,} rows.")
 
     except FileNotFoundError as e:
         print(f"❌ ERROR: File not found. Please check the filenames. Details: {e}")
@@ -43,18 +78,18 @@ if __name__ == "__main__":
     parser.add_argument(
         'original_file',
         type=str,
-        help="The original master CSV file (with missing data)."
+        help="The original master CSV or Parquet file (with missing data)."
     )
     parser.add_argument(
         'missing_data_file',
         type=str,
-        help="The newly downloaded CSV for the missing location."
+        help="The newly downloaded CSV or Parquet file for the missing location."
     )
     parser.add_argument(
         '-o', '--output',
         type=str,
-        default='coral_data_COMPLETE.csv',
-        help="The name for the final, merged output file."
+        default='coral_data_COMPLETE.parquet',
+        help="The name for the final, merged output file. Written as CSV if it ends in .csv, otherwise as Parquet."
     )
     args = parser.parse_args()
 
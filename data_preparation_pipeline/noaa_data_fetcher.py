@@ -1,11 +1,106 @@
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
-from io import StringIO
-from datetime import datetime
+import requests_cache
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+import threading
 import time
 import calendar
 
+# ERDDAP CSVs carry a header row and a units row; both are skipped and the columns
+# are named, typed and date-parsed in the same read. fetch_missing_data.py reuses
+# ERDDAP_COLUMNS for its pandas read.
+ERDDAP_COLUMNS = [
+    'time', 'latitude', 'longitude', 'sea_surface_temp_c', 'hotspot_c',
+    'degree_heating_week_c_weeks', 'sst_anomaly_c', 'bleaching_alert_area',
+    'bleaching_alert_area_7d_max'
+]
+ERDDAP_SCHEMA = pa.schema(
+    [('time', pa.timestamp('ns', tz='UTC'))] + [(col, pa.float32()) for col in ERDDAP_COLUMNS[1:]]
+)
+ERDDAP_READ_OPTIONS = pacsv.ReadOptions(column_names=ERDDAP_COLUMNS, skip_rows=2)
+ERDDAP_CONVERT_OPTIONS = pacsv.ConvertOptions(column_types=ERDDAP_SCHEMA)
+
+
+class RateLimiter:
+    """
+    Lets at most `calls` requests start within any `period` seconds.
+    Each acquired slot is handed back by a timer once the period has passed.
+    """
+
+    def __init__(self, calls, period):
+        self._slots = threading.Semaphore(calls)
+        self._period = period
+
+    def wait(self):
+        self._slots.acquire()
+        timer = threading.Timer(self._period, self._slots.release)
+        timer.daemon = True
+        timer.start()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that takes a slot from `rate_limiter` before each request it sends.
+    Responses served from the cache never reach the adapter, and urllib3's retries
+    happen inside `send`, so neither is throttled.
+    """
+
+    def __init__(self, rate_limiter, **kwargs):
+        self._rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self._rate_limiter.wait()
+        return super().send(request, **kwargs)
+
+
+# One keep-alive connection pool shared by all worker threads (fetch_missing_data.py
+# reuses it too). The adapter lets at most 10 new requests per second through; its
+# urllib3 retries of connection errors and 5xx responses back off exponentially but
+# are re-sent below the rate limiter, so they are not throttled. Responses are cached
+# on disk by URL: past years never change, so re-runs skip re-downloading them, and
+# stale entries are revalidated with ETag/Last-Modified where the server sends them.
+SESSION = requests_cache.CachedSession(
+    cache_name='noaa_cache',
+    backend='sqlite',
+    expire_after=timedelta(days=30),
+    cache_control=True
+)
+SESSION.mount("https://", RateLimitedAdapter(
+    RateLimiter(calls=10, period=1),
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=2, status_forcelist=[500, 502, 503, 504])
+))
+
+
+def is_body_read_error(error):
+    """
+    Tells whether a request failed while its response body was being read.
+
+    The adapter's urllib3 Retry already re-sends failed connections and 5xx responses,
+    so errors raised once it has given up (RetryError, or a ConnectionError caused by
+    MaxRetryError) are final. A body that breaks off mid-read is not covered by it.
+
+    Args:
+        error (Exception): Exception raised by SESSION.get or by reading the response.
+
+    Returns:
+        bool: True if the request is worth sending again.
+    """
+    if isinstance(error, (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        cause = error.args[0] if error.args else None
+        return not isinstance(cause, urllib3.exceptions.MaxRetryError)
+    return isinstance(error, urllib3.exceptions.ProtocolError)
+
 
 def get_coral_reef_watch_data(lat, lon, start_date, end_date, max_retries=3):
     """
@@ -16,10 +111,10 @@ def get_coral_reef_watch_data(lat, lon, start_date, end_date, max_retries=3):
         lon (float): Longitude of the target location.
         start_date (str): Start date in 'YYYY-MM-DD' format.
         end_date (str): End date in 'YYYY-MM-DD' format.
-        max_retries (int): Maximum number of retry attempts.
+        max_retries (int): Maximum number of attempts when the response body breaks off mid-read.
 
     Returns:
-        pandas.DataFrame: A DataFrame containing the time-series data, or None if the request fails.
+        pyarrow.Table: A table containing the time-series data, or None if the request fails.
     """
     base_url = "https://coastwatch.pfeg.noaa.gov/erddap/griddap/NOAA_DHW.csv"
     variables = [
@@ -35,67 +130,51 @@ def get_coral_reef_watch_data(lat, lon, start_date, end_date, max_retries=3):
     query = ",".join(query_parts)
     request_url = f"{base_url}?{query}"
 
+    label = f"({lat}, {lon}) {start_date} to {end_date}"
     for attempt in range(max_retries):
         try:
-            print(f"  Attempt {attempt + 1}/{max_retries}...", end=" ")
-            response = requests.get(request_url, timeout=120)
+            # The adapter retries failed connections and 5xx statuses; only a body that
+            # breaks off mid-read is retried here (see is_body_read_error).
+            response = SESSION.get(request_url, timeout=120)
             response.raise_for_status()
-
-            csv_data = response.text
-            if "ERROR" in csv_data or len(csv_data) < 100:
-                print(f"Server error or no data available")
-                if attempt < max_retries - 1:
-                    time.sleep(5)
-                    continue
+            # ERDDAP error pages fail to parse against the schema.
+            table = pacsv.read_csv(
+                pa.BufferReader(response.content),
+                read_options=ERDDAP_READ_OPTIONS,
+                convert_options=ERDDAP_CONVERT_OPTIONS
+            )
+            break
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            if not is_body_read_error(e) or attempt == max_retries - 1:
+                print(f"  {label}: Error: {e}")
                 return None
+            print(f"  {label}: Attempt {attempt + 1}/{max_retries} failed ({e}), retrying...")
+            time.sleep(2 ** attempt)
+        except pa.ArrowInvalid:
+            print(f"  {label}: Server error or no data available")
+            return None
 
-            df = pd.read_csv(StringIO(csv_data), skiprows=[1])
-            df.columns = [
-                'time', 'latitude', 'longitude', 'sea_surface_temp_c', 'hotspot_c',
-                'degree_heating_week_c_weeks', 'sst_anomaly_c', 'bleaching_alert_area',
-                'bleaching_alert_area_7d_max'
-            ]
-
-            df['time'] = pd.to_datetime(df['time'])
-            print(f"Success! ({len(df)} rows)")
-            return df
-
-        except requests.exceptions.Timeout:
-            print(f"Timeout")
-            if attempt < max_retries - 1:
-                print(f"  Retrying in 10 seconds...")
-                time.sleep(10)
-            else:
-                print(f"  Max retries reached")
-                return None
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error: {e}")
-            if attempt < max_retries - 1:
-                print(f"  Retrying in 10 seconds...")
-                time.sleep(10)
-            else:
-                print(f"  Max retries reached")
-                return None
+    if table.num_rows == 0:
+        print(f"  {label}: Server error or no data available")
+        return None
 
-    return None
+    print(f"  {label}: Success! ({table.num_rows} rows)")
+    return table
 
 
-def fetch_data_in_chunks(lat, lon, start_year, end_year, chunk_months=3):
+def chunk_date_ranges(start_year, end_year, chunk_months=3):
     """
-    Fetches data in smaller, more reliable monthly chunks.
+    Splits the requested years into (start_date, end_date) request windows.
 
     Args:
-        lat (float): Latitude
-        lon (float): Longitude
         start_year (int): Starting year
         end_year (int): Ending year
         chunk_months (int): Number of months per request (3 is a safe default)
 
     Returns:
-        list: List of DataFrames
+        list: List of ('YYYY-MM-DD', 'YYYY-MM-DD') tuples
     """
-    all_dfs = []
+    date_ranges = []
 
     for year in range(start_year, end_year + 1):
         for month_start in range(1, 13, chunk_months):
@@ -104,17 +183,75 @@ def fetch_data_in_chunks(lat, lon, start_year, end_year, chunk_months=3):
             start_date = f"{year}-{month_start:02d}-01"
             end_day = calendar.monthrange(year, month_end)[1]
             end_date = f"{year}-{month_end:02d}-{end_day}"
+            date_ranges.append((start_date, end_date))
+
+    return date_ranges
 
-            print(f"Fetching {start_date} to {end_date}...")
-            df = get_coral_reef_watch_data(lat, lon, start_date, end_date)
 
-            if df is not None and not df.empty:
-                all_dfs.append(df)
+def fetch_data_in_chunks(locations, start_year, end_year, chunk_months=3, max_workers=8):
+    """
+    Fetches data for every location in smaller, more reliable monthly chunks.
+    All (location, chunk) requests share one thread pool, so network waits overlap
+    instead of adding up.
+
+    Args:
+        locations (dict): Mapping of location name to {"lat": ..., "lon": ...}
+        start_year (int): Starting year
+        end_year (int): Ending year
+        chunk_months (int): Number of months per request (3 is a safe default)
+        max_workers (int): Maximum number of concurrent requests
+
+    Returns:
+        list: List of (location name, pyarrow.Table) tuples, in completion order
+    """
+    date_ranges = chunk_date_ranges(start_year, end_year, chunk_months)
+    all_chunks = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_coral_reef_watch_data, coords['lat'], coords['lon'], start_date, end_date):
+                (name, start_date, end_date)
+            for name, coords in locations.items()
+            for start_date, end_date in date_ranges
+        }
+        for future in as_completed(futures):
+            name, start_date, end_date = futures[future]
+            try:
+                table = future.result()
+            except Exception as e:
+                # One broken chunk must not abort the run and discard everything fetched so far.
+                print(f"  {name} {start_date} to {end_date}: Failed ({e})")
+                table = None
+
+            if table is not None and table.num_rows > 0:
+                all_chunks.append((name, table))
             else:
-                print(f"  No data returned for this chunk.")
-            time.sleep(2)
+                print(f"  No data returned for {name} {start_date} to {end_date}.")
+
+    return all_chunks
+
+
+def concat_chunks(all_chunks):
+    """
+    Stacks (location name, pyarrow.Table) chunks into one DataFrame.
+
+    The tables are concatenated as Arrow chunked arrays (no copy), combined once,
+    and only then converted to pandas, so pandas is materialised a single time.
+
+    Args:
+        all_chunks (list): List of (location name, pyarrow.Table) tuples
+
+    Returns:
+        pandas.DataFrame: All chunks stacked, with a 'location_name' column
+    """
+    tables = [
+        table.append_column('location_name', pa.array([name] * table.num_rows, pa.string()))
+        for name, table in all_chunks
+    ]
+    combined = pa.concat_tables(tables).combine_chunks()
+    return combined.to_pandas(split_blocks=True, self_destruct=True)
+
 
-    return all_dfs
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Fetch NOAA Coral Reef Watch data for key Indian reef locations."
@@ -122,8 +259,9 @@ if __name__ == "__main__":
     parser.add_argument(
         '-o', '--output',
         type=str,
-        default='coral_environmental_data_master.csv',
-        help='Path for the output CSV file. (default: coral_environmental_data_master.csv)'
+        default='coral_environmental_data_master.parquet',
+        help='Path for the output file, written as CSV if it ends in .csv, otherwise as Parquet. '
+             '(default: coral_environmental_data_master.parquet)'
     )
     parser.add_argument(
         '-s', '--start-year',
@@ -143,6 +281,12 @@ if __name__ == "__main__":
         default=3,
         help='Chunk size in months per request (e.g., 3=quarterly, 6=half-year). Default: 3 (safest)'
     )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=8,
+        help='Maximum number of concurrent requests (default: 8)'
+    )
     args = parser.parse_args()
 
     reef_locations = {
@@ -163,57 +307,55 @@ if __name__ == "__main__":
     print(f"Locations: {len(reef_locations)}")
     total_requests = len(reef_locations) * (end_year - start_year + 1) * (12 // args.chunk_months)
     print(f"Estimated total requests: {total_requests}")
-    print(f"Estimated time: ~{int((total_requests * 5) / 60)} minutes")
+    print(f"Concurrent requests: {args.workers}")
+    print(f"Estimated time: ~{max(1, int((total_requests * 5) / (60 * args.workers)))} minutes")
     print("=" * 70)
     print()
 
-    all_location_dfs = []
-
-    for idx, (name, coords) in enumerate(reef_locations.items(), 1):
-        print(f"[{idx}/{len(reef_locations)}] Processing location: {name}")
-        print(f"  Coordinates: ({coords['lat']}, {coords['lon']})")
-        print("-" * 70)
-
-        location_dfs = fetch_data_in_chunks(
-            coords['lat'],
-            coords['lon'],
-            start_year,
-            end_year,
-            args.chunk_months
-        )
-
-        if location_dfs:
-            location_df = pd.concat(location_dfs, ignore_index=True)
-            location_df['location_name'] = name
-            location_df = location_df.sort_values('time').reset_index(drop=True)
+    all_chunks = fetch_data_in_chunks(
+        reef_locations,
+        start_year,
+        end_year,
+        args.chunk_months,
+        args.workers
+    )
+    print()
 
-            all_location_dfs.append(location_df)
-            print(f"✅ Successfully collected {len(location_df)} records for {name}")
-        else:
+    fetched_locations = {name for name, _ in all_chunks}
+    for name in reef_locations:
+        if name not in fetched_locations:
             print(f"❌ Failed to download any data for {name}")
 
-        print()
-
-    if all_location_dfs:
+    if all_chunks:
         print("=" * 70)
         print("--- Combining all location data into master file ---")
         print("=" * 70)
 
-        master_df = pd.concat(all_location_dfs, ignore_index=True)
+        # Concatenate every chunk once and sort once, instead of per location.
+        master_df = concat_chunks(all_chunks)
         cols = ['time', 'latitude', 'longitude', 'location_name',
                 'sea_surface_temp_c', 'hotspot_c', 'degree_heating_week_c_weeks',
                 'sst_anomaly_c', 'bleaching_alert_area', 'bleaching_alert_area_7d_max']
         master_df = master_df[cols]
-        master_df = master_df.sort_values(['location_name', 'time']).reset_index(drop=True)
+        master_df = master_df.sort_values(['location_name', 'time'], ignore_index=True)
+
+        # Values are already float32 from the parser; shrink the labels and alert levels too.
+        master_df['location_name'] = master_df['location_name'].astype('category')
+        alert_cols = ['bleaching_alert_area', 'bleaching_alert_area_7d_max']
+        if not master_df[alert_cols].isna().any().any():
+            master_df[alert_cols] = master_df[alert_cols].astype('uint8')
 
         output_filename = args.output
-        master_df.to_csv(output_filename, index=False)
+        if output_filename.endswith('.csv'):
+            pacsv.write_csv(pa.Table.from_pandas(master_df, preserve_index=False), output_filename)
+        else:
+            master_df.to_parquet(output_filename, compression='zstd', index=False)
 
         print(f"\n✅ SUCCESS! All data combined and saved to '{output_filename}'")
         print(f"Total rows collected: {len(master_df):,}")
         print(f"Date range: {master_df['time'].min().date()} to {master_df['time'].max().date()}")
         print(f"\nData summary by location:")
-        print(master_df.groupby('location_name').size())
+        print(master_df.groupby('location_name', observed=True).size())
         print("\nFirst 5 rows of the master dataset:")
         print(master_df.head())
         print("\nLast 5 rows of the master dataset:")
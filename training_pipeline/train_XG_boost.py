@@ -1,4 +1,12 @@
+import os
+
+# GPU training needs no CPU worker pool; keep OpenMP from spinning up one thread per
+# core that would only busy-wait on the CUDA stream. Must be set before xgboost loads.
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from sklearn.model_selection import train_test_split
 import xgboost as xgb
 from sklearn.metrics import mean_absolute_error, r2_score
@@ -12,44 +20,66 @@ def train_model(data_path):
     and saves the trained model to a file.
     """
     print("--- Starting Model Training with XGBoost (GPU) ---")
-    try:
-        df = pd.read_csv(data_path)
-        print(f"✅ Successfully loaded {len(df)} rows from '{data_path}'")
-    except FileNotFoundError:
-        print(f"❌ ERROR: Processed data file not found at '{data_path}'")
-        return
     features = [
         'sea_surface_temp_c', 'hotspot_c', 'degree_heating_week_c_weeks',
         'sst_anomaly_c', 'bleaching_alert_area', 'bleaching_alert_area_7d_max',
         'year', 'month', 'day_of_year', 'week_of_year'
     ]
     target = 'bleaching_risk_percent'
+    columns = features + [target]
 
-    X = df[features]
-    y = df[target]
+    try:
+        # Only the model columns (and the preprocessor's 'split', when present) are read;
+        # Parquet keeps the float32 dtypes, CSV is still accepted for older processed files.
+        if data_path.endswith('.parquet'):
+            split_col = ['split'] if 'split' in pq.read_schema(data_path).names else []
+            df = pd.read_parquet(data_path, columns=columns + split_col, engine='pyarrow')
+        else:
+            df = pd.read_csv(data_path, usecols=lambda col: col in columns or col == 'split')
+        print(f"✅ Successfully loaded {len(df)} rows from '{data_path}'")
+    except FileNotFoundError:
+        print(f"❌ ERROR: Processed data file not found at '{data_path}'")
+        return
+
+    # A single C-contiguous float32 matrix (the calendar columns are exact in float32):
+    # xgboost bins it into its QuantileDMatrix directly from the buffer instead of
+    # inferring dtypes and copying column by column out of the DataFrame.
+    X = np.ascontiguousarray(df[features].to_numpy(dtype=np.float32))
+    y = df[target].to_numpy(dtype=np.float32)
 
     print(f"\nFeatures being used for training: {features}")
     print(f"Target variable: {target}")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
+    if 'split' in df.columns:
+        # Same held-out rows for every trainer, selected with a plain boolean mask.
+        train_mask = df['split'].to_numpy(dtype=bool)
+        X_train, X_test = X[train_mask], X[~train_mask]
+        y_train, y_test = y[train_mask], y[~train_mask]
+        print("\nUsing the train/test split saved by the preprocessor.")
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
     print(f"\nData split into training ({len(X_train)} rows) and testing ({len(X_test)} rows) sets.")
     print("\nTraining the XGBoost Regressor model on GPU...")
+    # device='cuda' with the 'hist' method replaces the deprecated 'gpu_hist'; the
+    # sklearn wrapper builds QuantileDMatrix inputs for it, with the eval set binned
+    # against the training quantiles. Early stopping lives on the estimator in xgboost 2+.
     xgb_reg = xgb.XGBRegressor(
         objective='reg:squarederror',
-        tree_method='gpu_hist',
+        device='cuda',
+        tree_method='hist',
         n_estimators=200,
         learning_rate=0.05,
         max_depth=6,
         subsample=0.8,
         colsample_bytree=0.8,
+        eval_metric='mae',
+        early_stopping_rounds=10,
         random_state=42,
-        n_jobs=-1
+        n_jobs=1
     )
     xgb_reg.fit(X_train, y_train,
                 eval_set=[(X_test, y_test)],
-                eval_metric='mae',
-                early_stopping_rounds=10,
                 verbose=True)
 
     print("\n✅ Model training complete.")
@@ -63,9 +93,14 @@ def train_model(data_path):
     print(f"Mean Absolute Error (MAE): {mae:.4f}")
     print("------------------------")
     model_filename = 'coral_bleaching_model.pkl'
+    booster_filename = 'coral_bleaching_model.ubj'
     try:
-        joblib.dump(xgb_reg, model_filename)
+        # LZ4-compressed pickle, the format the app loads.
+        joblib.dump(xgb_reg, model_filename, compress=('lz4', 3), protocol=5)
         print(f"\n✅ Trained model successfully saved to '{model_filename}'")
+        # The native Universal Binary JSON format stays loadable across xgboost versions.
+        xgb_reg.save_model(booster_filename)
+        print(f"✅ XGBoost booster also saved to '{booster_filename}'")
     except Exception as e:
         print(f"\n❌ ERROR: Could not save the model. Reason: {e}")
 
@@ -75,7 +110,7 @@ if __name__ == "__main__":
     parser.add_argument(
         'input_file',
         type=str,
-        help='Path to the processed input CSV file (e.g., coral_data_PROCESSED.csv)'
+        help='Path to the processed input Parquet or CSV file (e.g., coral_data_PROCESSED.parquet)'
     )
     args = parser.parse_args()
 